@@ -7,10 +7,13 @@ from pydantic import BaseModel
 import numpy as np
 import pandas as pd
 from tortoise.queryset import QuerySet
-import plotly.graph_objects as go
 from tqdm import tqdm
 
+from . import charts
+from . import models
 from . import schemas
+from .costs import CostModel
+from .costs import PercentageFee
 from .indicators import Indicator, PositionType
 
 TINKOFF_COMISSION = Decimal(0.0005)
@@ -19,20 +22,110 @@ TINKOFF_COMISSION = Decimal(0.0005)
 class Position(BaseModel):
     type: t.Optional[PositionType]
     open_time: t.Optional[dt.datetime]
-    open_price: t.Optional[dt.datetime]
+    open_price: t.Optional[Decimal]
     close_time: t.Optional[dt.datetime]
-    close_price: t.Optional[dt.datetime]
+    close_price: t.Optional[Decimal]
+
+
+class StreamingStatistics:
+    """Online accumulator of backtest statistics
+
+    Updated by every closed position, so memory usage doesn't depend on the number of positions.
+    Mean and variance of profit ratio are calculated with Welford's algorithm. Trading costs are applied
+    by `cost_model` (flat `comission_fee` by default), models which require candles are not supported.
+    """
+    def __init__(self, comission_fee: Decimal = TINKOFF_COMISSION, cost_model: CostModel = None):
+        self.comission_fee = comission_fee
+        self.cost_model = cost_model or PercentageFee(comission_fee)
+
+        if self.cost_model.requires_candles:
+            raise ValueError(f'{type(self.cost_model).__name__} requires candles, which are not kept while streaming!')
+
+        self.count = 0
+        self.wins = 0
+
+        self.equity = 1.0
+        self.peak_equity = 1.0
+        self.max_drawdown = 0.0
+
+        self.last_close_time: dt.datetime = None
+
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._log_sum = 0.0
+
+    def update(self, position: Position):
+        profit_ratio = float(self.cost_model.profit_ratio(pd.DataFrame([position.dict()]))[0])
+        self.count += 1
+        self.last_close_time = position.close_time
+
+        if profit_ratio > 1:
+            self.wins += 1
+
+        delta = profit_ratio - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (profit_ratio - self._mean)
+        self._log_sum += np.log(profit_ratio)
+
+        self.equity *= profit_ratio
+        self.peak_equity = max(self.peak_equity, self.equity)
+        self.max_drawdown = max(self.max_drawdown, 1 - self.equity / self.peak_equity)
+
+    @property
+    def ariph_mean(self) -> float:
+        return self._mean if self.count else np.nan
+
+    @property
+    def variance(self) -> float:
+        # sample variance, same as `pd.Series.var`
+        return self._m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.variance)
+
+    @property
+    def geo_mean(self) -> float:
+        return np.exp(self._log_sum / self.count) if self.count else np.nan
+
+    @property
+    def twr(self) -> float:
+        return self.equity
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.count if self.count else np.nan
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'win_rate': self.win_rate,
+            'ariph_mean': self.ariph_mean,
+            'std': self.std,
+            'geo_mean': self.geo_mean,
+            'twr': self.twr,
+            'max_drawdown': self.max_drawdown,
+        }
 
 
 class BacktesterMarket:
 
-    def __init__(self, balance=Decimal(10000)):
+    def __init__(
+        self, balance=Decimal(10000), statistics: StreamingStatistics = None, keep_positions: bool = True
+    ):
         self._positions: t.List[Position] = []
+        self._keep_positions = keep_positions
+
+        self.statistics = statistics
 
         self.current_time: dt.datetime = None
         self.current_price: Decimal = None
         self.current_position = Position()
 
+    @property
+    def position_type(self) -> t.Optional[PositionType]:
+        return self.current_position.type
+
     def open_position(self, position_type: PositionType):
         if self.current_position.type is not None:
             raise RuntimeError('Position already opened!')
@@ -48,17 +141,23 @@ class BacktesterMarket:
         self.current_position.close_time = self.current_time
         self.current_position.close_price = self.current_price
 
-        self._positions.append(self.current_position)
+        if self.statistics is not None:
+            self.statistics.update(self.current_position)
+
+        if self._keep_positions:
+            self._positions.append(self.current_position)
+
         self.current_position = Position()
 
     @property
     def positions_df(self) -> pd.DataFrame:
-        return pd.DataFrame.from_dict(position.dict() for position in self._positions)
+        # Columns are set explicitly, so DataFrame of backtest without positions has them too
+        return pd.DataFrame([position.dict() for position in self._positions], columns=list(Position.__fields__))
 
 
 class Backtester:
 
-    def __init__(self, candles: t.Iterable[schemas.Candle]):
+    def __init__(self, candles: t.Union[t.Iterable[schemas.Candle], t.AsyncIterable[schemas.Candle]]):
         self._candles = candles
         self.market = BacktesterMarket()
 
@@ -77,7 +176,21 @@ class Backtester:
             schemas.Candle.from_orm(candle) for candle in candles_qs
         ))
 
-    def run(self, indicator: Indicator, comission_fee=TINKOFF_COMISSION) -> 'BacktesterStatistics':
+    @classmethod
+    def from_cursor(cls, candles_qs: QuerySet, prefetch: int = 1000) -> 'Backtester':
+        """Create backtester, which reads candles from DB by server-side cursor.
+
+        Should be used with `run_streaming` method.
+        """
+        async def _candles():
+            async for candle in models.iter_cursor(candles_qs, prefetch):
+                yield schemas.Candle(**candle)
+
+        return cls(candles=_candles())
+
+    def run(
+        self, indicator: Indicator, comission_fee=TINKOFF_COMISSION, cost_model: CostModel = None
+    ) -> 'BacktesterStatistics':
         indicator.start(self.market)
 
         self._candles, self._candles_cache = itertools.tee(self._candles)
@@ -93,7 +206,51 @@ class Backtester:
 
             prev_candle = next_candle
 
-        return BacktesterStatistics(self.market.positions_df, comission_fee)
+        candles = None
+        if cost_model is not None and cost_model.requires_candles:
+            candles = pd.DataFrame.from_dict(candle.dict() for candle in self._candles_cache)
+
+        return BacktesterStatistics(self.market.positions_df, comission_fee, cost_model, candles)
+
+    async def run_streaming(
+        self, indicator: Indicator, comission_fee=TINKOFF_COMISSION, cost_model: CostModel = None
+    ) -> StreamingStatistics:
+        """Run backtest in bounded memory.
+
+        Neither candles nor positions are stored, statistics are accumulated while positions are closed.
+        """
+        self.market = BacktesterMarket(
+            statistics=StreamingStatistics(comission_fee, cost_model), keep_positions=False
+        )
+        indicator.start(self.market)
+
+        prev_candle = None
+
+        async for next_candle in self._aiter_candles():
+            if prev_candle is not None:
+                self.market.current_time = next_candle.time
+                self.market.current_price = next_candle.open
+
+                indicator._on_candle(prev_candle)
+
+            prev_candle = next_candle
+
+        return self.market.statistics
+
+    async def _aiter_candles(self) -> t.AsyncGenerator[schemas.Candle, None]:
+        if hasattr(self._candles, '__aiter__'):
+            candles = self._candles
+        else:
+            async def _wrap():
+                for candle in self._candles:
+                    yield candle
+
+            candles = _wrap()
+
+        with tqdm() as progress:
+            async for candle in candles:
+                yield candle
+                progress.update()
 
     # def _prepare_trades_df(self) -> pd.DataFrame:
     #     """Собрать DataFrame с совершенными сделками на основе рыночной истории сделок
@@ -114,33 +271,39 @@ class Backtester:
 
 
 class BacktesterStatistics:
-
-    def __init__(self, positions: pd.DataFrame, comission_fee: Decimal):
+    """Statistics of backtest positions
+
+    Trading costs are applied by `cost_model` (flat `comission_fee` by default). Positions can be
+    re-costed by another model via `recost` without rerunning backtest.
+    """
+    def __init__(
+        self,
+        positions: pd.DataFrame,
+        comission_fee: Decimal,
+        cost_model: CostModel = None,
+        candles: pd.DataFrame = None,
+    ):
         self._raw_positions = positions
         self.comission_fee = comission_fee
+        self.cost_model = cost_model or PercentageFee(comission_fee)
+        self._candles = candles
 
         self._positions = None
 
-    def _calc_profit_ratio(self, row):
-        if row.type == PositionType.long:
-            return float(
-                (Decimal(row.close_price) - Decimal(row.close_price) * self.comission_fee) /
-                (Decimal(row.open_price) + Decimal(row.open_price) * self.comission_fee)
-            )
-        else:
-            return float(
-                (Decimal(row.open_price) + Decimal(row.open_price) * self.comission_fee) /
-                (Decimal(row.close_price) - Decimal(row.close_price) * self.comission_fee)
-            )
+    @classmethod
+    def from_positions(cls, positions: pd.DataFrame, comission_fee: Decimal) -> 'BacktesterStatistics':
+        """Create statistics from already calculated positions (with `profit_ratio` and `equity` columns)
+        """
+        statistics = cls(positions, comission_fee)
+        statistics._positions = positions
+        return statistics
 
-    @staticmethod
-    def _calc_equity(profit_ratio):
-        equity = [Decimal(1)]
-        for val in profit_ratio:
-            current_eq = equity[-1] * Decimal(val)
-            equity.append(current_eq)
+    def recost(self, cost_model: CostModel, candles: pd.DataFrame = None) -> 'BacktesterStatistics':
+        if candles is None:
+            candles = self._candles
 
-        return equity[1:]
+        columns = ['type', 'open_time', 'open_price', 'close_time', 'close_price']
+        return BacktesterStatistics(self._raw_positions[columns], self.comission_fee, cost_model, candles)
 
     @property
     def positions(self):
@@ -148,8 +311,8 @@ class BacktesterStatistics:
             return self._positions
 
         positions = self._raw_positions.copy()
-        positions['profit_ratio'] = positions.apply(self._calc_profit_ratio, axis=1)
-        positions['equity'] = self._calc_equity(positions.profit_ratio.values)
+        positions['profit_ratio'] = self.cost_model.profit_ratio(positions, self._candles)
+        positions['equity'] = np.cumprod(positions.profit_ratio.values)
 
         self._positions = positions
         return positions
@@ -179,13 +342,4 @@ class BacktesterStatistics:
 
     @property
     def equity_graph(self):
-        equity_graph = go.Figure(data=[
-            go.Scatter(
-                name='Equity',
-                x=self.positions.close_time,
-                y=self.positions.equity,
-                line=dict(color='#fe8019', width=1)
-            ),
-        ])
-        equity_graph.update_layout(template='plotly_white')
-        return equity_graph
+        return charts.equity_graph(self.positions)
@@ -0,0 +1,209 @@
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import time
+import typing as t
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+from tortoise.functions import Count
+from tortoise.functions import Max
+
+from . import config
+from . import models
+from .coverage import check_coverage
+from .backtesting import TINKOFF_COMISSION
+from .backtesting import Backtester
+from .backtesting import BacktesterStatistics
+from .indicators import Indicator
+from .schemas import Interval
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """On-disk cache of backtest results
+
+    Entry key is a hash of candles range and its data version, indicator class with parameters and comission fee.
+    Data version changes when candles of the range are imported, so outdated entries are never hit
+    (and are evicted later). Positions are stored in parquet, metrics in json. When cache size exceeds
+    `max_size_mb`, least recently used entries are evicted.
+    """
+    def __init__(self, path: str = config.BACKTEST_CACHE_DIR, max_size_mb: int = config.BACKTEST_CACHE_SIZE_MB):
+        self.path = Path(path)
+        self.max_size = max_size_mb * 1024 * 1024
+
+    @staticmethod
+    async def data_version(ticker: str, interval: Interval, start_dt: dt.datetime, end_dt: dt.datetime) -> str:
+        result = await models.Candle.filter(
+            instrument__ticker=ticker, interval=interval, time__gte=start_dt, time__lte=end_dt
+        ).annotate(count=Count('id'), max_id=Max('id')).values('count', 'max_id')
+
+        return '{count}:{max_id}'.format(**result[0])
+
+    async def key(
+        self,
+        ticker: str,
+        interval: Interval,
+        start_dt: dt.datetime,
+        end_dt: dt.datetime,
+        indicator: Indicator,
+        comission_fee: Decimal,
+    ) -> str:
+        payload = {
+            'ticker': ticker,
+            'interval': str(interval),
+            'start': start_dt.isoformat(),
+            'end': end_dt.isoformat(),
+            'version': await self.data_version(ticker, interval, start_dt, end_dt),
+            'indicator': f'{type(indicator).__module__}.{type(indicator).__qualname__}',
+            'params': indicator.params,
+            'comission_fee': str(comission_fee),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _positions_path(self, key: str) -> Path:
+        return self.path / f'{key}.parquet'
+
+    def _meta_path(self, key: str) -> Path:
+        return self.path / f'{key}.json'
+
+    def get(self, key: str) -> t.Optional[BacktesterStatistics]:
+        positions_path = self._positions_path(key)
+        if not positions_path.exists():
+            return None
+
+        meta = self.meta(key)
+        if meta is None:
+            # Entry was not written completely
+            self._remove(key)
+            return None
+
+        positions = pd.read_parquet(positions_path)
+
+        # Update access time for LRU eviction
+        os.utime(positions_path)
+
+        return BacktesterStatistics.from_positions(positions, Decimal(meta['comission_fee']))
+
+    def meta(self, key: str) -> t.Optional[dict]:
+        meta_path = self._meta_path(key)
+        if not meta_path.exists():
+            return None
+
+        with meta_path.open() as f:
+            return json.load(f)
+
+    def put(self, key: str, statistics: BacktesterStatistics, meta: dict):
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        positions = statistics.positions.copy()
+        for column in ('open_price', 'close_price', 'equity'):
+            positions[column] = positions[column].astype(float)
+
+        positions.to_parquet(self._positions_path(key), index=False)
+
+        meta = {
+            **meta,
+            'comission_fee': str(statistics.comission_fee),
+            'created_at': dt.datetime.now().isoformat(),
+            'metrics': {
+                'count': len(positions),
+                'ariph_mean': statistics.ariph_mean if len(positions) else None,
+                'geo_mean': statistics.geo_mean if len(positions) else None,
+                'twr': statistics.twr,
+            },
+        }
+        with self._meta_path(key).open('w') as f:
+            json.dump(meta, f, default=str)
+
+        self.evict()
+
+    def evict(self):
+        entries = sorted(self.path.glob('*.parquet'), key=lambda path: path.stat().st_mtime)
+        size = sum(path.stat().st_size for path in self.path.iterdir())
+
+        for positions_path in entries:
+            if size <= self.max_size:
+                break
+
+            size -= self._remove(positions_path.stem)
+
+    def _remove(self, key: str) -> int:
+        removed_size = 0
+        for path in (self._positions_path(key), self._meta_path(key)):
+            if path.exists():
+                removed_size += path.stat().st_size
+                path.unlink()
+
+        return removed_size
+
+    def invalidate(
+        self, ticker: str = None, interval: Interval = None, start_dt: dt.datetime = None, end_dt: dt.datetime = None
+    ):
+        """Remove entries, which overlap with candles range (remove all entries if range is not set)
+        """
+        if not self.path.exists():
+            return
+
+        for meta_path in self.path.glob('*.json'):
+            key = meta_path.stem
+            meta = self.meta(key)
+
+            if ticker is not None and meta['ticker'] != ticker:
+                continue
+
+            if interval is not None and meta['interval'] != str(interval):
+                continue
+
+            if start_dt is not None and dt.datetime.fromisoformat(meta['end']) < start_dt:
+                continue
+
+            if end_dt is not None and dt.datetime.fromisoformat(meta['start']) > end_dt:
+                continue
+
+            self._remove(key)
+
+    async def run(
+        self,
+        ticker: str,
+        interval: Interval,
+        start_dt: dt.datetime,
+        end_dt: dt.datetime,
+        indicator: Indicator,
+        comission_fee: Decimal = TINKOFF_COMISSION,
+    ) -> BacktesterStatistics:
+        """Get backtest result from cache or run backtest and cache its result
+        """
+        key = await self.key(ticker, interval, start_dt, end_dt, indicator, comission_fee)
+
+        statistics = self.get(key)
+        if statistics is not None:
+            logger.info('Backtest result is loaded from cache (key=%s)', key[:12])
+            return statistics
+
+        await check_coverage(ticker, interval, start_dt, end_dt)
+
+        started_at = time.monotonic()
+
+        candles = await models.Candle.filter(
+            instrument__ticker=ticker, interval=interval, time__gte=start_dt, time__lte=end_dt
+        ).order_by('time')
+        statistics = Backtester.from_db(candles).run(indicator, comission_fee)
+
+        self.put(key, statistics, meta={
+            'ticker': ticker,
+            'interval': str(interval),
+            'start': start_dt.isoformat(),
+            'end': end_dt.isoformat(),
+            'indicator': type(indicator).__qualname__,
+            'params': indicator.params,
+            'duration': time.monotonic() - started_at,
+        })
+        return statistics
+
+
+cache = ResultCache()
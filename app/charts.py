@@ -0,0 +1,225 @@
+import typing as t
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from .indicators import PositionType
+
+
+# Amount of points per trace, which is sent to the browser. Roughly equals to chart width in pixels
+DEFAULT_POINTS = 2000
+
+EQUITY_COLOR = '#fe8019'
+PRICE_COLOR = '#83a598'
+LONG_COLOR = '#b8bb26'
+SHORT_COLOR = '#fb4934'
+CLOSE_COLOR = '#928374'
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Return indices of points, which preserve visual shape of the series.
+    """
+    size = len(x)
+    if n_points >= size or n_points < 3:
+        return np.arange(size)
+
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, size - 1, n_points - 1).astype(np.int64)
+
+    indices = np.empty(n_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, size - 1
+
+    selected = 0
+    for i in range(n_points - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+
+        next_start = edges[i + 1]
+        next_end = max(edges[i + 2] if i + 2 < len(edges) else size, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected]) -
+            (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        indices[i + 1] = selected
+
+    return indices
+
+
+def minmax(y: np.ndarray, n_points: int) -> np.ndarray:
+    """Min/max per bucket downsampling.
+
+    Return indices of minimum and maximum values of each bucket, so price spikes are always visible.
+    """
+    size = len(y)
+    n_buckets = n_points // 2
+    if n_buckets < 1 or n_points >= size:
+        return np.arange(size)
+
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, size, n_buckets + 1).astype(np.int64)
+
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if start == end:
+            continue
+
+        bucket = y[start:end]
+        indices.extend((start + int(np.argmin(bucket)), start + int(np.argmax(bucket))))
+
+    return np.unique(indices)
+
+
+def stride(y: np.ndarray, n_points: int) -> np.ndarray:
+    """Uniform downsampling, used for markers
+    """
+    size = len(y)
+    if n_points >= size:
+        return np.arange(size)
+
+    return np.unique(np.linspace(0, size - 1, n_points).astype(np.int64))
+
+
+DOWNSAMPLERS: t.Dict[str, t.Callable] = {
+    'lttb': lambda x, y, n_points: lttb(x, y, n_points),
+    'minmax': lambda x, y, n_points: minmax(y, n_points),
+    'stride': lambda x, y, n_points: stride(y, n_points),
+}
+
+
+def _as_float(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(float)
+
+    return x.astype(float)
+
+
+def _axis_value(x: np.ndarray, value) -> float:
+    if np.issubdtype(x.dtype, np.datetime64):
+        return float(pd.Timestamp(value).value)
+
+    return float(value)
+
+
+def _as_array(values) -> np.ndarray:
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values) or pd.api.types.is_object_dtype(values):
+        try:
+            return pd.to_datetime(values).dt.tz_localize(None).values
+        except (TypeError, ValueError):
+            pass
+
+    return values.values
+
+
+def downsample(x, y, n_points: int = DEFAULT_POINTS, method: str = 'lttb') -> t.Tuple[np.ndarray, np.ndarray]:
+    x, y = _as_array(x), np.asarray(y, dtype=float)
+    indices = DOWNSAMPLERS[method](x, y, n_points)
+
+    return x[indices], y[indices]
+
+
+class ResampledFigure:
+    """WebGL figure, which keeps full data in the kernel and sends only downsampled points to the browser
+
+    On zoom, visible range is re-downsampled from the full data, so details are appeared without
+    increasing payload size. Requires `ipywidgets` (works in Jupyter only).
+    """
+    def __init__(self, n_points: int = DEFAULT_POINTS, **layout):
+        self.n_points = n_points
+
+        self.figure = go.FigureWidget()
+        self.figure.update_layout(template='plotly_white', **layout)
+        self.figure.layout.on_change(self._on_zoom, 'xaxis.range', 'xaxis.autorange')
+
+        self._series: t.List[t.Tuple[int, np.ndarray, np.ndarray, str]] = []
+
+    def add_series(self, trace: go.Scattergl, x, y, method: str = 'lttb'):
+        x, y = _as_array(x), np.asarray(y, dtype=float)
+
+        self.figure.add_trace(trace)
+        trace_idx = len(self.figure.data) - 1
+        self._series.append((trace_idx, x, y, method))
+
+        self._render(trace_idx, x, y, method)
+
+    def _render(self, trace_idx: int, x: np.ndarray, y: np.ndarray, method: str, x_range: tuple = None):
+        if x_range is not None:
+            start, end = np.searchsorted(_as_float(x), [_axis_value(x, v) for v in x_range])
+            # Keep neighbour points, so lines are not cut on the chart borders
+            x, y = x[max(start - 1, 0):end + 1], y[max(start - 1, 0):end + 1]
+
+        x, y = downsample(x, y, self.n_points, method)
+
+        trace = self.figure.data[trace_idx]
+        trace.x, trace.y = x, y
+
+    def _on_zoom(self, layout, x_range, autorange):
+        # Autoscale and reset axes should show the full series, not the last zoomed slice
+        if autorange is True:
+            x_range = None
+
+        with self.figure.batch_update():
+            for trace_idx, x, y, method in self._series:
+                self._render(trace_idx, x, y, method, x_range)
+
+    def show(self):
+        return self.figure
+
+
+def equity_graph(positions: pd.DataFrame, n_points: int = DEFAULT_POINTS) -> go.Figure:
+    """Downsampled equity graph of backtest positions
+    """
+    x, y = downsample(positions.close_time, positions.equity.astype(float), n_points, method='lttb')
+
+    figure = go.Figure(data=[
+        go.Scattergl(name='Equity', x=x, y=y, line=dict(color=EQUITY_COLOR, width=1)),
+    ])
+    figure.update_layout(template='plotly_white')
+    return figure
+
+
+def candles_graph(
+    candles: pd.DataFrame, positions: pd.DataFrame = None, n_points: int = DEFAULT_POINTS
+) -> go.FigureWidget:
+    """Interactive price graph with trade markers, which is re-downsampled on zoom
+
+    `candles` should contain `time` and `close` columns, `positions` is `BacktesterStatistics.positions`.
+    """
+    figure = ResampledFigure(n_points)
+    figure.add_series(
+        go.Scattergl(name='Price', mode='lines', line=dict(color=PRICE_COLOR, width=1)),
+        candles.time, candles.close.astype(float), method='minmax',
+    )
+
+    if positions is not None and len(positions):
+        markers = (
+            (PositionType.long, LONG_COLOR, 'triangle-up'),
+            (PositionType.short, SHORT_COLOR, 'triangle-down'),
+        )
+        for position_type, color, symbol in markers:
+            opened = positions[positions.type == position_type]
+            figure.add_series(
+                go.Scattergl(
+                    name=f'Open {position_type}', mode='markers',
+                    marker=dict(color=color, size=7, symbol=symbol),
+                ),
+                opened.open_time, opened.open_price.astype(float), method='stride',
+            )
+
+        figure.add_series(
+            go.Scattergl(
+                name='Close', mode='markers', marker=dict(color=CLOSE_COLOR, size=7, symbol='x'),
+            ),
+            positions.close_time, positions.close_price.astype(float), method='stride',
+        )
+
+    return figure.show()
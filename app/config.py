@@ -43,3 +43,9 @@ TINKOFF_TRADING_TOKEN = env.str('TINKOFF_TRADING_TOKEN')
 
 TZ_NAME = env.str('TZ_NAME', 'Asia/Yekaterinburg')
 TIMEZONE = pytz.timezone(TZ_NAME)
+
+
+BACKTEST_CACHE_DIR = env.str('BACKTEST_CACHE_DIR', '.cache/backtests')
+BACKTEST_CACHE_SIZE_MB = env.int('BACKTEST_CACHE_SIZE_MB', 512)
+
+FEATURE_STORE_DIR = env.str('FEATURE_STORE_DIR', '.features')
@@ -0,0 +1,135 @@
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+from .schemas import PositionType
+
+
+# Default trade size (in account currency), used by size-dependent models
+DEFAULT_NOTIONAL = 10000.0
+
+
+class Fills(t.NamedTuple):
+    """Trades of one side (open or close) as arrays
+    """
+    price: np.ndarray
+    notional: np.ndarray
+    volume: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+
+
+class CostModel:
+    """Interface of trading costs model
+
+    Costs are calculated as rate (fraction of price) for all trades at once, so re-costing of
+    positions doesn't require rerun of backtest. Models are combined by `+`.
+    """
+    requires_candles = False
+
+    def rate(self, fills: Fills) -> np.ndarray:
+        raise NotImplementedError
+
+    def __add__(self, other: 'CostModel') -> 'CompositeCostModel':
+        return CompositeCostModel(self, other)
+
+    def profit_ratio(
+        self, positions: pd.DataFrame, candles: pd.DataFrame = None, notional: float = DEFAULT_NOTIONAL
+    ) -> np.ndarray:
+        if self.requires_candles and candles is None:
+            raise ValueError(f'{type(self).__name__} requires candles data!')
+
+        if positions.empty:
+            return np.empty(0)
+
+        open_fills = make_fills(positions.open_time, positions.open_price, candles, notional)
+        close_fills = make_fills(positions.close_time, positions.close_price, candles, notional)
+
+        # Buys are filled above the price and sells below it. Long is opened by buy and closed by sell,
+        # short is opened by sell and closed by buy
+        is_long = (positions.type == PositionType.long).values
+        side = np.where(is_long, 1.0, -1.0)
+
+        open_price = open_fills.price * (1 + side * self.rate(open_fills))
+        close_price = close_fills.price * (1 - side * self.rate(close_fills))
+
+        return np.where(is_long, close_price / open_price, open_price / close_price)
+
+
+class CompositeCostModel(CostModel):
+
+    def __init__(self, *models: CostModel):
+        self.models = []
+        for model in models:
+            self.models.extend(model.models if isinstance(model, CompositeCostModel) else [model])
+
+        self.requires_candles = any(model.requires_candles for model in self.models)
+
+    def rate(self, fills: Fills) -> np.ndarray:
+        return sum(model.rate(fills) for model in self.models)
+
+
+class PercentageFee(CostModel):
+    """Broker comission: percentage of trade value, but not less than `min_fee` (in account currency)
+    """
+    def __init__(self, rate: float, min_fee: float = 0.0):
+        self.fee_rate = float(rate)
+        self.min_fee = float(min_fee)
+
+    def rate(self, fills: Fills) -> np.ndarray:
+        return np.maximum(self.fee_rate, self.min_fee / fills.notional)
+
+
+class VolumeSlippage(CostModel):
+    """Price impact, which grows with share of candle volume taken by the trade
+
+    rate = impact * (trade_volume / candle_volume) ^ exponent, limited by `max_rate`
+    """
+    requires_candles = True
+
+    def __init__(self, impact: float = 0.1, exponent: float = 0.5, max_rate: float = 0.05):
+        self.impact = impact
+        self.exponent = exponent
+        self.max_rate = max_rate
+
+    def rate(self, fills: Fills) -> np.ndarray:
+        trade_volume = fills.notional / fills.price
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            participation = np.where(fills.volume > 0, trade_volume / fills.volume, np.inf)
+
+        return np.minimum(self.impact * participation ** self.exponent, self.max_rate)
+
+
+class HighLowSpread(CostModel):
+    """Half of bid-ask spread, estimated as `ratio` of candle high-low range
+    """
+    requires_candles = True
+
+    def __init__(self, ratio: float = 0.25):
+        self.ratio = ratio
+
+    def rate(self, fills: Fills) -> np.ndarray:
+        return self.ratio * (fills.high - fills.low) / fills.price / 2
+
+
+def make_fills(
+    times: pd.Series, prices: pd.Series, candles: pd.DataFrame = None, notional: float = DEFAULT_NOTIONAL
+) -> Fills:
+    """Match trades with candles, at which they are executed (candle time equals to trade time)
+    """
+    price = prices.values.astype(float)
+    size = len(price)
+
+    if candles is None:
+        volume = high = low = np.full(size, np.nan)
+    else:
+        candle_times = pd.to_datetime(candles.time).values
+        idx = np.clip(np.searchsorted(candle_times, pd.to_datetime(times).values), 0, len(candle_times) - 1)
+
+        volume = candles.volume.values.astype(float)[idx]
+        high = candles.high.values.astype(float)[idx]
+        low = candles.low.values.astype(float)[idx]
+
+    return Fills(price=price, notional=np.full(size, float(notional)), volume=volume, high=high, low=low)
@@ -0,0 +1,176 @@
+import asyncio
+import bisect
+import datetime as dt
+import logging
+import typing as t
+
+from tortoise.functions import Max
+from tortoise.functions import Min
+from tortoise.transactions import in_transaction
+
+from . import models
+from .schemas import Interval
+
+logger = logging.getLogger(__name__)
+
+
+Range = t.Tuple[dt.datetime, dt.datetime]
+Key = t.Tuple[int, str]
+
+
+class CoverageError(RuntimeError):
+    pass
+
+
+class CoverageIndex:
+    """Index of imported candle time ranges per (instrument, interval)
+
+    Ranges are stored sorted and merged, so coverage queries are done by binary search in memory.
+    Every imported range is persisted to `models.CandleCoverage`, so index is restored by `load`.
+    Market-closed periods inside imported ranges are covered too (they are known to have no candles).
+    """
+    def __init__(self):
+        self._starts: t.Dict[Key, t.List[dt.datetime]] = {}
+        self._ends: t.Dict[Key, t.List[dt.datetime]] = {}
+        self._locks: t.Dict[Key, asyncio.Lock] = {}
+
+        self.loaded = False
+
+    async def load(self):
+        """Restore index from DB. If coverage is not saved yet, it is built from already imported candles
+        """
+        self._starts, self._ends = {}, {}
+
+        items = await models.CandleCoverage.all().order_by('start')
+        for item in items:
+            self.add(item.instrument_id, item.interval, item.start, item.end)
+
+        self.loaded = True
+
+        if not items:
+            await self.build_from_candles()
+
+    async def build_from_candles(self):
+        """Create coverage for candles imported before coverage index existed
+
+        Whole range between first and last candle is considered as imported. Range ends right after the last
+        candle time, so next import doesn't fetch stored candle again.
+        """
+        if not self.loaded:
+            await self.load()
+
+        ranges = await models.Candle.all().group_by('instrument_id', 'interval').annotate(
+            start=Min('time'), end=Max('time')
+        ).values('instrument_id', 'interval', 'start', 'end')
+
+        for item in ranges:
+            end = item['end'] + dt.timedelta(microseconds=1)
+
+            if not self.covered(item['instrument_id'], item['interval'], item['start'], end):
+                await self.save(item['instrument_id'], item['interval'], item['start'], end)
+
+        logger.info('Coverage index is built from %s imported candle series', len(ranges))
+
+    def ranges(self, instrument_id: int, interval: Interval) -> t.List[Range]:
+        key = (instrument_id, str(interval))
+        return list(zip(self._starts.get(key, []), self._ends.get(key, [])))
+
+    def add(self, instrument_id: int, interval: Interval, start: dt.datetime, end: dt.datetime) -> Range:
+        """Add range to the index and return merged range, which contains it
+        """
+        key = (instrument_id, str(interval))
+        starts = self._starts.setdefault(key, [])
+        ends = self._ends.setdefault(key, [])
+
+        # Ranges, which overlap or touch the new one
+        left = bisect.bisect_left(ends, start)
+        right = bisect.bisect_right(starts, end)
+
+        if left < right:
+            start = min(start, starts[left])
+            end = max(end, ends[right - 1])
+
+        starts[left:right] = [start]
+        ends[left:right] = [end]
+
+        return start, end
+
+    def covered(self, instrument_id: int, interval: Interval, start: dt.datetime, end: dt.datetime) -> bool:
+        key = (instrument_id, str(interval))
+        starts = self._starts.get(key, [])
+
+        idx = bisect.bisect_right(starts, start) - 1
+        return idx >= 0 and self._ends[key][idx] >= end
+
+    def missing(
+        self, instrument_id: int, interval: Interval, start: dt.datetime, end: dt.datetime
+    ) -> t.List[Range]:
+        """Get ranges inside [start, end], which are not imported yet
+        """
+        key = (instrument_id, str(interval))
+        starts = self._starts.get(key, [])
+        ends = self._ends.get(key, [])
+
+        result = []
+        cursor = start
+
+        for idx in range(bisect.bisect_right(ends, start), bisect.bisect_left(starts, end)):
+            if starts[idx] > cursor:
+                result.append((cursor, starts[idx]))
+
+            cursor = max(cursor, ends[idx])
+
+        if cursor < end:
+            result.append((cursor, end))
+
+        return result
+
+    async def save(self, instrument_id: int, interval: Interval, start: dt.datetime, end: dt.datetime):
+        """Add range to the index and persist merged range to DB
+
+        Merge and DB write are serialized per (instrument, interval), otherwise concurrent importers
+        could delete each other's merged ranges.
+        """
+        lock = self._locks.setdefault((instrument_id, str(interval)), asyncio.Lock())
+
+        async with lock:
+            merged_start, merged_end = self.add(instrument_id, interval, start, end)
+
+            async with in_transaction():
+                await models.CandleCoverage.filter(
+                    instrument_id=instrument_id,
+                    interval=interval,
+                    start__lte=merged_end,
+                    end__gte=merged_start,
+                ).delete()
+                await models.CandleCoverage.create(
+                    instrument_id=instrument_id, interval=interval, start=merged_start, end=merged_end
+                )
+
+
+index = CoverageIndex()
+
+
+async def check_coverage(
+    ticker: str, interval: Interval, start: dt.datetime, end: dt.datetime, strict: bool = False
+) -> t.List[Range]:
+    """Check that candles are imported for the whole range before backtest
+
+    Return missing ranges. Missing ranges are logged as warning or raise `CoverageError` if `strict` is set.
+    """
+    if not index.loaded:
+        await index.load()
+
+    instrument = await models.Instrument.get(ticker=ticker)
+    missing = index.missing(instrument.id, interval, start, end)
+
+    if missing:
+        message = f'Candles of {ticker} ({interval}) are not imported for ranges: ' + ', '.join(
+            f'{range_start} - {range_end}' for range_start, range_end in missing
+        )
+        if strict:
+            raise CoverageError(message)
+
+        logger.warning(message)
+
+    return missing
@@ -0,0 +1,334 @@
+import asyncio
+import bisect
+import datetime as dt
+import logging
+import time
+import typing as t
+
+import aiohttp
+
+from . import config
+from .schemas import Candle
+from .schemas import Interval
+from .schemas import Order
+from .schemas import OrderRequest
+from .tinkoff import APIError
+from .tinkoff import make_tz_aware
+from .tinkoff import parse_candle
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket limiter of API requests, shared by concurrent tasks
+    """
+    def __init__(self, rate: int = 120, period: float = 60):
+        self.rate = rate
+        self.period = period
+
+        self._tokens = float(rate)
+        self._updated_at = time.monotonic()
+        self._lock: asyncio.Lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated_at) * self.rate / self.period)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) * self.period / self.rate)
+
+
+class AsyncTinkoffClient:
+    """Asynchronous client for Invest API (orders and market data endpoints)
+
+    HTTP connections are pooled (up to `pool_size`), so requests for different instruments are sent concurrently.
+    `base_url` may point to local sandbox stand-in server for testing.
+    """
+    def __init__(
+        self,
+        base_url: str = config.TINKOFF_SANDBOX_URL,
+        token: str = config.TINKOFF_SANDBOX_TOKEN,
+        broker_account_id: str = None,
+        pool_size: int = 10,
+        rate_limiter: RateLimiter = None,
+    ):
+        self._base_url = base_url
+        self._token = token
+        self._broker_account_id = broker_account_id
+        self._pool_size = pool_size
+        self._rate_limiter = rate_limiter
+
+        self._session: aiohttp.ClientSession = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_size),
+                headers={'Authorization': f'Bearer {self._token}'},
+            )
+
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self) -> 'AsyncTinkoffClient':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, method: str, endpoint: str, data: dict = None, params: dict = None) -> dict:
+        if data is None:
+            data = dict()
+
+        if params is None:
+            params = dict()
+
+        if self._broker_account_id:
+            params['brokerAccountId'] = self._broker_account_id
+
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire()
+
+        async with self.session.request(method, self._base_url + endpoint, json=data, params=params) as response:
+            if response.status == 429:
+                logger.info('API requests limit reached. Waiting 1 min...')
+                await asyncio.sleep(60)
+                return await self.request(method, endpoint, data, params)
+
+            response_data = await response.json()
+
+        if response_data['status'] == 'Error':
+            payload = response_data['payload']
+
+            raise APIError(payload['message'], payload['code'])
+
+        return response_data['payload']
+
+    async def get_candles(
+        self, figi: str, interval: Interval, start_dt: dt.datetime, end_dt: dt.datetime
+    ) -> t.List[Candle]:
+        """Get historic candles for selected instrument, period and interval.
+        """
+        response = await self.request('GET', 'market/candles', params={
+            'figi': figi,
+            'from': make_tz_aware(start_dt),
+            'to': make_tz_aware(end_dt),
+            'interval': str(interval),
+        })
+        if 'candles' not in response:
+            raise APIError(response['message'], response['code'])
+
+        return [parse_candle(candle) for candle in response['candles']]
+
+    @staticmethod
+    def _parse_order(data: dict, figi: str = None) -> Order:
+        return Order(
+            order_id=data['orderId'],
+            figi=data.get('figi', figi),
+            operation=data['operation'],
+            status=data['status'],
+            requested_lots=data['requestedLots'],
+            executed_lots=data.get('executedLots', 0),
+            reject_reason=data.get('rejectReason'),
+        )
+
+    async def limit_order(self, order: OrderRequest) -> Order:
+        response = await self.request('POST', 'orders/limit-order', params={'figi': order.figi}, data={
+            'lots': order.lots,
+            'operation': order.operation,
+            'price': float(order.price),
+        })
+        return self._parse_order(response, order.figi)
+
+    async def market_order(self, order: OrderRequest) -> Order:
+        response = await self.request('POST', 'orders/market-order', params={'figi': order.figi}, data={
+            'lots': order.lots,
+            'operation': order.operation,
+        })
+        return self._parse_order(response, order.figi)
+
+    async def place_order(self, order: OrderRequest) -> Order:
+        if order.price is None:
+            return await self.market_order(order)
+
+        return await self.limit_order(order)
+
+    async def cancel_order(self, order_id: str):
+        await self.request('POST', 'orders/cancel', params={'orderId': order_id})
+
+    async def get_orders(self) -> t.List[Order]:
+        """Get active orders
+        """
+        response = await self.request('GET', 'orders')
+        return [self._parse_order(order) for order in response]
+
+
+class LatencyHistogram:
+    """Histogram of latencies with log-scaled buckets (in milliseconds)
+    """
+    buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency: float):
+        latency_ms = latency * 1000
+
+        self.counts[bisect.bisect_left(self.buckets, latency_ms)] += 1
+        self.count += 1
+        self.total += latency_ms
+        self.max = max(self.max, latency_ms)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket, which contains `q` percentile (0 < q <= 100)
+        """
+        threshold = self.count * q / 100
+        cumulative = 0
+
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if count and cumulative >= threshold:
+                return bucket
+
+        return 0.0
+
+    def as_dict(self) -> t.Dict[str, int]:
+        return {f'<={bucket}ms': count for bucket, count in zip(self.buckets, self.counts)}
+
+    def __repr__(self):
+        return (
+            f'LatencyHistogram(count={self.count}, mean={self.mean:.1f}ms, '
+            f'p50<={self.percentile(50)}ms, p99<={self.percentile(99)}ms, max={self.max:.1f}ms)'
+        )
+
+
+class OrderExecutor:
+    """Asynchronous order execution engine
+
+    Orders are put to pending queue and submitted concurrently by `workers` tasks.
+    Statuses of active orders are polled in background until orders are filled, cancelled or rejected.
+    Submit-to-ack latency is recorded to `latency` histogram.
+    """
+    def __init__(self, client: AsyncTinkoffClient, workers: int = 4, poll_interval: float = 1.0):
+        self.client = client
+        self.latency = LatencyHistogram()
+
+        self._workers_count = workers
+        self._poll_interval = poll_interval
+
+        self._queue: asyncio.Queue = None
+        self._loop: asyncio.AbstractEventLoop = None
+        self._tasks: t.List[asyncio.Task] = []
+
+        self.active_orders: t.Dict[str, Order] = {}
+        self.orders: t.List[Order] = []
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+        self._tasks.append(asyncio.create_task(self._poller()))
+
+        logger.info('Order executor started (workers=%s)', self._workers_count)
+
+    async def stop(self):
+        await self._queue.join()
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        logger.info('Order executor stopped. %s', self.latency)
+
+    def submit_nowait(self, order: OrderRequest) -> asyncio.Future:
+        """Put order to pending queue. Can be called from sync code, but only in event loop thread
+        (asyncio futures are not thread-safe)
+
+        Return future, which is resolved by placed order.
+        """
+        if self._loop is None:
+            raise RuntimeError('You should call `start` method before submitting orders!')
+
+        future = self._loop.create_future()
+        self._queue.put_nowait((order, future))
+        return future
+
+    async def submit(self, order: OrderRequest) -> Order:
+        return await self.submit_nowait(order)
+
+    async def _worker(self):
+        while True:
+            order_request, future = await self._queue.get()
+            try:
+                started_at = time.monotonic()
+                order = await self.client.place_order(order_request)
+                self.latency.record(time.monotonic() - started_at)
+
+            except Exception as e:
+                logger.exception('Order placing failed (FIGI=%s)', order_request.figi)
+                # Caller could cancel waiting for the order (e.g. by timeout)
+                if not future.done():
+                    future.set_exception(e)
+
+            else:
+                logger.info(
+                    'Order %s placed: %s %s lots of %s (status=%s)',
+                    order.order_id, order.operation, order.requested_lots, order_request.figi, order.status,
+                )
+                self.orders.append(order)
+                if order.is_active:
+                    self.active_orders[order.order_id] = order
+
+                if not future.done():
+                    future.set_result(order)
+
+            finally:
+                self._queue.task_done()
+
+    async def _poller(self):
+        while True:
+            await asyncio.sleep(self._poll_interval)
+
+            if not self.active_orders:
+                continue
+
+            try:
+                orders = {order.order_id: order for order in await self.client.get_orders()}
+            except Exception:
+                # Any failure (timeout, unexpected response) shouldn't stop polling
+                logger.exception('Orders polling failed')
+                continue
+
+            # Orders endpoint returns only active orders, so missing ones are completed
+            for order_id in list(self.active_orders):
+                if order_id in orders:
+                    self.active_orders[order_id] = orders[order_id]
+                else:
+                    logger.info('Order %s completed', order_id)
+                    del self.active_orders[order_id]
+
+    async def cancel_all(self):
+        await asyncio.gather(*(self.client.cancel_order(order_id) for order_id in self.active_orders))
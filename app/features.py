@@ -0,0 +1,149 @@
+import datetime as dt
+import hashlib
+import json
+import logging
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from . import models
+from .schemas import Interval
+
+logger = logging.getLogger(__name__)
+
+
+class Feature:
+    """Interface of indicator series, which is computed from candles and persisted in `FeatureStore`
+
+    Value at candle depends only on `window` last candles, so series can be extended incrementally.
+    """
+    name: str = None
+    window: int = 1
+
+    @property
+    def params(self) -> dict:
+        return {}
+
+    def compute(self, candles: pd.DataFrame) -> pd.DataFrame:
+        """Compute feature columns for `candles` (with `time` and OHLCV columns) sorted by time
+        """
+        raise NotImplementedError
+
+
+class SMAFeature(Feature):
+    """Simple moving averages of close price (in cents, as in `PriceHistory`)
+    """
+    name = 'sma'
+
+    def __init__(self, sizes: t.Tuple[int, ...] = (2, 8, 14, 20)):
+        self.sizes = tuple(sizes)
+        self.window = max(self.sizes)
+
+    @property
+    def params(self) -> dict:
+        return {'sizes': self.sizes}
+
+    def compute(self, candles: pd.DataFrame) -> pd.DataFrame:
+        close = np.round(candles.close.astype(float) * 100).astype(np.int64)
+
+        features = pd.DataFrame({'time': candles.time.values, 'close': close.values})
+        for size in self.sizes:
+            features[f'sma_{size}'] = np.floor(close.rolling(size).mean()).values
+
+        return features
+
+
+class FeatureStore:
+    """Precomputed indicator series per (instrument, interval, feature, params), stored in parquet files
+
+    `update` recomputes only the tail of series, which is affected by new candles (plus `window` candles
+    before it), so importing new candles doesn't require recomputing the whole history.
+    `features` are maintained by importers on every import (see `update_all`).
+    """
+    def __init__(self, features: t.Iterable[Feature] = (), path: str = config.FEATURE_STORE_DIR):
+        self.features = list(features)
+        self.path = Path(path)
+
+    def _file_path(self, ticker: str, interval: Interval, feature: Feature) -> Path:
+        params_hash = hashlib.sha1(json.dumps(feature.params, sort_keys=True).encode()).hexdigest()[:10]
+        return self.path / f'{ticker}_{interval}_{feature.name}_{params_hash}.parquet'
+
+    def load(
+        self,
+        ticker: str,
+        interval: Interval,
+        feature: Feature,
+        start_dt: dt.datetime = None,
+        end_dt: dt.datetime = None,
+    ) -> t.Optional[pd.DataFrame]:
+        file_path = self._file_path(ticker, interval, feature)
+        if not file_path.exists():
+            return None
+
+        features = pd.read_parquet(file_path)
+
+        if start_dt is not None:
+            features = features[features.time >= start_dt]
+
+        if end_dt is not None:
+            features = features[features.time <= end_dt]
+
+        return features.reset_index(drop=True)
+
+    async def update(
+        self, ticker: str, interval: Interval, feature: Feature, since: dt.datetime = None
+    ) -> pd.DataFrame:
+        """Extend stored series by candles, which are newer than `since` (or last stored candle)
+
+        `since` should be set to the start of imported range, if candles are imported into the middle of history.
+        """
+        stored = self.load(ticker, interval, feature)
+
+        candles_qs = models.Candle.filter(instrument__ticker=ticker, interval=interval).order_by('time')
+
+        if stored is not None and len(stored):
+            if since is None:
+                since = stored.time.iloc[-1]
+
+            kept = stored[stored.time < since]
+            # Candles before `since`, which are needed to compute the first updated values
+            if len(kept) >= feature.window:
+                candles_qs = candles_qs.filter(time__gte=kept.time.iloc[-feature.window])
+            else:
+                kept = kept.iloc[:0]
+        else:
+            kept = None
+
+        candles = pd.DataFrame(await candles_qs.values('time', 'open', 'high', 'low', 'close', 'volume'))
+        if candles.empty:
+            return stored
+
+        computed = feature.compute(candles)
+
+        if kept is not None and len(kept):
+            computed = pd.concat([kept, computed[computed.time >= since]], ignore_index=True)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        computed.to_parquet(self._file_path(ticker, interval, feature), index=False)
+
+        logger.info('Updated %s feature of %s (%s), %s rows total', feature.name, ticker, interval, len(computed))
+        return computed
+
+    async def update_all(self, ticker: str, interval: Interval, since: dt.datetime = None):
+        for feature in self.features:
+            await self.update(ticker, interval, feature, since)
+
+
+def sma_lookup(features: pd.DataFrame, sizes: t.Tuple[int, ...]) -> t.Dict[dt.datetime, tuple]:
+    """Map candle time to SMA values (skipping warm-up rows without values)
+    """
+    columns = [f'sma_{size}' for size in sizes]
+    features = features.dropna(subset=columns)
+
+    return dict(zip(
+        features.time.dt.to_pydatetime(),
+        features[columns].astype(np.int64).itertuples(index=False, name=None),
+    ))
@@ -1,8 +1,14 @@
 import datetime as dt
 import logging
+import typing as t
+from decimal import Decimal
+
+import pandas as pd
 
 from . import schemas
+from .features import sma_lookup
 from .market import Market
+from .schemas import PositionType
 from .utils import PriceHistory
 
 
@@ -14,11 +20,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class PositionType(schemas.Enum):
-    long = 'long'
-    short = 'short'
-
-
 class Indicator:
 
     def __init__(self):
@@ -36,6 +37,16 @@ class Indicator:
     def start(self, market: Market):
         self.market = market
 
+    def warm_up(self, history: pd.DataFrame):
+        """Restore indicator state from precomputed history (see `FeatureStore`), so it can act immediately
+        """
+
+    @property
+    def params(self) -> dict:
+        """Indicator parameters, which affect its decisions (used as part of backtest cache key)
+        """
+        return {}
+
 
 # TODO: Check cases when SMA(i) = SMA(j)
 class OrderedSMAIndicator(Indicator):
@@ -50,22 +61,61 @@ class OrderedSMAIndicator(Indicator):
     Закрытие short позиции: SMA(2) > SMA(8)
     """
 
-    def __init__(self):
+    sma_sizes = (2, 8, 14, 20)
+
+    def __init__(self, features: pd.DataFrame = None):
+        """`features` - precomputed `SMAFeature` series, which are used instead of calculating SMA on every candle
+        """
         super().__init__()
 
         self.history = PriceHistory(size=20)
 
-        self.current_position: PositionType = None
+        self._features = features
+        self._sma_lookup: t.Dict[dt.datetime, tuple] = {}
+        if features is not None:
+            self._sma_lookup = sma_lookup(features, self.sma_sizes)
+
+        # History is not updated while precomputed SMA are used
+        self._history_stale = False
+
         self.current_time: dt.datetime = None
 
+    def warm_up(self, history: pd.DataFrame):
+        for time, close in history[['time', 'close']].tail(self.history._size).itertuples(index=False):
+            self.history.add(Decimal(int(close)) / 100, time)
+
+    @property
+    def params(self) -> dict:
+        # With precomputed features, decisions are made from the first candle (without 20 candles warm-up),
+        # so results differ and shouldn't share cache entry
+        return {
+            'sma_sizes': list(self.sma_sizes),
+            'precomputed_features': self._features is not None,
+        }
+
+    @property
+    def current_position(self) -> t.Optional[PositionType]:
+        # Market is the only source of position state (e.g. `TinkoffMarket` rolls back position of failed order)
+        return self.market.position_type
+
     def on_candle(self, candle: schemas.Candle):
-        self.history.add(candle.close, candle.time)
         self.current_time = candle.time
 
-        if len(self.history) < 20:
-            return
+        current_sma = self._sma_lookup.get(candle.time)
+        if current_sma is not None:
+            self._history_stale = True
+        else:
+            if self._history_stale:
+                self.history = PriceHistory(size=20)
+                self.warm_up(self._features[self._features.time < candle.time])
+                self._history_stale = False
+
+            self.history.add(candle.close, candle.time)
+
+            if len(self.history) < 20:
+                return
 
-        current_sma = tuple(self.history.calc_sma(size) for size in (2, 8, 14, 20))
+            current_sma = tuple(self.history.calc_sma(size) for size in self.sma_sizes)
 
         if self.current_position is None:
             self._try_open_position(current_sma)
@@ -90,7 +140,6 @@ class OrderedSMAIndicator(Indicator):
             position = PositionType.short
 
         if position is not None:
-            self.current_position = position
             self.market.open_position(position)
 
             logger.debug('Open %s position at %s', position, self.current_time)
@@ -100,7 +149,6 @@ class OrderedSMAIndicator(Indicator):
 
         if sma2 < sma8:
             self.market.close_position()
-            self.current_position = None
 
         logger.debug('Close long position at %s', self.current_time)
 
@@ -109,6 +157,5 @@ class OrderedSMAIndicator(Indicator):
 
         if sma2 > sma8:
             self.market.close_position()
-            self.current_position = None
 
         logger.debug('Close short position at %s', self.current_time)
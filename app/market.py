@@ -1,9 +1,15 @@
+import asyncio
+import functools
+import logging
 import typing as t
 from decimal import Decimal
 
 from . import schemas
+from .execution import OrderExecutor
 from .tinkoff import client as tinkoff_client
 
+logger = logging.getLogger(__name__)
+
 
 # TODO: Update interface
 class Market:
@@ -23,19 +29,95 @@ class Market:
     def sell(self, amount: Decimal):
         raise NotImplementedError
 
+    @property
+    def position_type(self) -> t.Optional[schemas.PositionType]:
+        """Type of currently opened position (None if there is no opened position)
+        """
+        raise NotImplementedError
+
+    def open_position(self, position_type: schemas.PositionType):
+        raise NotImplementedError
+
+    def close_position(self):
+        raise NotImplementedError
+
 
 # TODO: Update interface
 class TinkoffMarket(Market):
     """Proxy to Tinkoff Investments API
+
+    Orders are performed by market price through async `executor` (should be started before indicator receives
+    candles), so `buy` and `sell` don't block indicator.
     """
+    def __init__(self, figi: str = None, lots: int = 1, executor: OrderExecutor = None):
+        self.figi = figi
+        self.lots = lots
+        self.executor = executor
+
+        self.current_position: schemas.PositionType = None
+
     def get_balance(self) -> Decimal:
         return tinkoff_client.get_balance_usd()
 
     def get_portfolio(self) -> t.List[schemas.PortfolioItem]:
         return tinkoff_client.get_portfolio()
 
-    def buy(self, amount: Decimal):
-        ...
+    def _submit(self, operation: schemas.Operation, amount: Decimal) -> asyncio.Future:
+        if self.executor is None or self.figi is None:
+            raise RuntimeError('Market should be created with `figi` and `executor` to perform orders!')
 
-    def sell(self, amount: Decimal):
-        ...
+        return self.executor.submit_nowait(
+            schemas.OrderRequest(figi=self.figi, operation=operation, lots=int(amount))
+        )
+
+    def buy(self, amount: Decimal) -> asyncio.Future:
+        return self._submit(schemas.Operation.BUY, amount)
+
+    def sell(self, amount: Decimal) -> asyncio.Future:
+        return self._submit(schemas.Operation.SELL, amount)
+
+    @property
+    def position_type(self) -> t.Optional[schemas.PositionType]:
+        return self.current_position
+
+    def open_position(self, position_type: schemas.PositionType):
+        if self.current_position is not None:
+            raise RuntimeError('Position already opened!')
+
+        if position_type == schemas.PositionType.long:
+            future = self.buy(self.lots)
+        else:
+            future = self.sell(self.lots)
+
+        self.current_position = position_type
+        future.add_done_callback(functools.partial(self._on_order_done, None))
+
+    def close_position(self):
+        if self.current_position is None:
+            raise RuntimeError('Position is not opened!')
+
+        if self.current_position == schemas.PositionType.long:
+            future = self.sell(self.lots)
+        else:
+            future = self.buy(self.lots)
+
+        future.add_done_callback(functools.partial(self._on_order_done, self.current_position))
+        self.current_position = None
+
+    def _on_order_done(self, previous_position: t.Optional[schemas.PositionType], future: asyncio.Future):
+        """Roll back position, if order was not placed or was rejected by broker
+        """
+        if future.cancelled():
+            logger.warning('Waiting for order (FIGI=%s) was cancelled, position state is unknown', self.figi)
+            return
+
+        if future.exception() is not None:
+            logger.error('Order (FIGI=%s) failed: %r', self.figi, future.exception())
+
+        elif future.result().status == schemas.OrderStatus.REJECTED:
+            logger.error('Order (FIGI=%s) rejected: %s', self.figi, future.result().reject_reason)
+
+        else:
+            return
+
+        self.current_position = previous_position
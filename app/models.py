@@ -1,8 +1,11 @@
+import typing as t
+
 from numpy.lib.financial import ipmt
 from tortoise import Tortoise
 from tortoise import fields
 from tortoise import models
 from tortoise.fields.base import CASCADE
+from tortoise.queryset import QuerySet
 
 from . import config
 from . import schemas
@@ -20,6 +23,19 @@ async def db_size():
     return f'{size_mb} MB'
 
 
+async def iter_cursor(qs: QuerySet, prefetch: int = 1000) -> t.AsyncGenerator[dict, None]:
+    """Iterate over queryset rows using server-side cursor.
+
+    Only `prefetch` rows are held in memory at once, so it is safe to use for huge candle ranges.
+    """
+    conn = Tortoise.get_connection("default")
+
+    async with conn.acquire_connection() as connection:
+        async with connection.transaction():
+            async for record in connection.cursor(qs.sql(), prefetch=prefetch):
+                yield dict(record)
+
+
 class Instrument(models.Model):
     id = fields.IntField(pk=True)
 
@@ -48,3 +64,38 @@ class Candle(models.Model):
     class Meta:
         indexes = (('instrument', 'interval', 'time'), )
         unique_together = (('instrument', 'interval', 'time'), )
+
+
+class CandleCoverage(models.Model):
+    """Time range, for which candles are imported (including market-closed periods without candles)
+    """
+    instrument = fields.ForeignKeyField('models.Instrument', related_name='coverage', on_delete=CASCADE)
+    interval = fields.CharField(max_length=5)
+
+    start = fields.DatetimeField()
+    end = fields.DatetimeField()
+
+    class Meta:
+        indexes = (('instrument', 'interval', 'start'), )
+
+
+class ImportJob(models.Model):
+    """Chunk of candles import, processed by `ImportOrchestrator`
+    """
+    instrument = fields.ForeignKeyField('models.Instrument', related_name='import_jobs', on_delete=CASCADE)
+    interval = fields.CharField(max_length=5)
+
+    start = fields.DatetimeField()
+    end = fields.DatetimeField()
+
+    status = fields.CharField(max_length=8, default=schemas.ImportJobStatus.PENDING)
+    attempts = fields.IntField(default=0)
+    candles_count = fields.IntField(default=0)
+    error = fields.TextField(null=True)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        indexes = ('status', )
+        unique_together = (('instrument', 'interval', 'start'), )
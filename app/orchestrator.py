@@ -0,0 +1,261 @@
+import asyncio
+import datetime as dt
+import logging
+import time
+import typing as t
+
+from tortoise.functions import Count
+from tqdm import tqdm
+
+from . import config
+from . import coverage
+from . import models
+from .execution import AsyncTinkoffClient
+from .execution import RateLimiter
+from .features import FeatureStore
+from .schemas import ImportJobStatus
+from .schemas import Interval
+from .tinkoff import TinkoffImporter
+
+logger = logging.getLogger(__name__)
+
+
+class ImportProgress:
+    """Progress and throughput metrics of orchestrator run
+    """
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.candles = 0
+
+        self.started_at = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def jobs_per_sec(self) -> float:
+        return (self.done + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def candles_per_sec(self) -> float:
+        return self.candles / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def eta(self) -> t.Optional[dt.timedelta]:
+        if not self.jobs_per_sec:
+            return None
+
+        return dt.timedelta(seconds=(self.total - self.done - self.failed) / self.jobs_per_sec)
+
+    def __repr__(self):
+        return (
+            f'ImportProgress(done={self.done}/{self.total}, failed={self.failed}, candles={self.candles}, '
+            f'jobs/s={self.jobs_per_sec:.2f}, candles/s={self.candles_per_sec:.1f}, eta={self.eta})'
+        )
+
+
+class ImportOrchestrator:
+    """Resumable import of candles for the whole instruments universe
+
+    Import is split to jobs (instrument x interval x date chunk), which are persisted in `models.ImportJob`.
+    Jobs are processed by concurrent workers with shared rate limiter. After restart, only unfinished
+    jobs are processed again. Jobs, which failed `max_attempts` times, are skipped until `retry_failed` is called.
+
+    >>> orchestrator = ImportOrchestrator(AsyncTinkoffClient(config.TINKOFF_URL, config.TINKOFF_TRADING_TOKEN))
+    >>> await orchestrator.plan(dt.datetime(2020, 1, 1), dt.datetime(2020, 10, 25), [Interval.M10])
+    >>> await orchestrator.run()
+    """
+    def __init__(
+        self,
+        client: AsyncTinkoffClient = None,
+        workers: int = 4,
+        rate_limiter: RateLimiter = None,
+        max_attempts: int = 3,
+        feature_store: FeatureStore = None,
+    ):
+        # `rate_limiter` is used only if `client` is not passed, otherwise client should be created with it
+        if client is None:
+            client = AsyncTinkoffClient(
+                config.TINKOFF_URL, config.TINKOFF_TRADING_TOKEN, rate_limiter=rate_limiter or RateLimiter()
+            )
+
+        self._client = client
+        self._workers_count = workers
+        self._max_attempts = max_attempts
+        self._feature_store = feature_store
+
+        # Earliest imported candle time per (ticker, interval), used to update features after import
+        self._imported_since: t.Dict[t.Tuple[str, str], dt.datetime] = {}
+
+        self.progress: ImportProgress = None
+
+    async def plan(
+        self,
+        start_dt: dt.datetime,
+        end_dt: dt.datetime,
+        intervals: t.Iterable[Interval],
+        tickers: t.Iterable[str] = None,
+    ) -> int:
+        """Create jobs for ranges, which are not imported yet. Return count of created jobs
+        """
+        if not coverage.index.loaded:
+            await coverage.index.load()
+
+        instruments_qs = models.Instrument.all()
+        if tickers is not None:
+            instruments_qs = instruments_qs.filter(ticker__in=list(tickers))
+
+        end_dt = min(end_dt, dt.datetime.now(config.TIMEZONE).replace(tzinfo=None))
+        intervals = list(intervals)
+
+        objs = []
+        for instrument in await instruments_qs:
+            for interval in intervals:
+                planned = set(await models.ImportJob.filter(
+                    instrument_id=instrument.id, interval=interval
+                ).values_list('start', flat=True))
+
+                for range_start, range_end in coverage.index.missing(instrument.id, interval, start_dt, end_dt):
+                    objs.extend(
+                        models.ImportJob(instrument=instrument, interval=interval, start=chunk_start, end=chunk_end)
+                        for chunk_start, chunk_end in self._split(interval, range_start, range_end)
+                        if chunk_start not in planned
+                    )
+
+        await models.ImportJob.bulk_create(objs)
+
+        logger.info('Planned %s import jobs', len(objs))
+        return len(objs)
+
+    @staticmethod
+    def _split(
+        interval: Interval, start_dt: dt.datetime, end_dt: dt.datetime
+    ) -> t.Generator[t.Tuple[dt.datetime, dt.datetime], None, None]:
+        if interval in (Interval.D7, Interval.D30):
+            yield start_dt, end_dt
+            return
+
+        batch_size = TinkoffImporter.candle_batch_size[interval]
+
+        cursor_start = start_dt
+        while cursor_start < end_dt:
+            cursor_end = min(cursor_start + batch_size, end_dt)
+            yield cursor_start, cursor_end
+
+            cursor_start = cursor_end
+
+    async def status(self) -> t.Dict[str, int]:
+        """Count of jobs per status
+        """
+        rows = await models.ImportJob.all().group_by('status').annotate(
+            count=Count('id')
+        ).values('status', 'count')
+
+        return {row['status']: row['count'] for row in rows}
+
+    async def retry_failed(self) -> int:
+        """Reset attempts of failed jobs, so they are processed by next `run`. Return count of reset jobs
+        """
+        count = await models.ImportJob.filter(status=ImportJobStatus.FAILED).update(attempts=0)
+
+        logger.info('Reset attempts of %s failed import jobs', count)
+        return count
+
+    async def run(self) -> ImportProgress:
+        # Jobs, which were running before restart, are not finished
+        await models.ImportJob.filter(status=ImportJobStatus.RUNNING).update(status=ImportJobStatus.PENDING)
+
+        job_ids = await models.ImportJob.filter(
+            status__in=(ImportJobStatus.PENDING, ImportJobStatus.FAILED),
+            attempts__lt=self._max_attempts,
+        ).order_by('start').values_list('id', flat=True)
+
+        queue = asyncio.Queue()
+        for job_id in job_ids:
+            queue.put_nowait(job_id)
+
+        self.progress = ImportProgress(total=len(job_ids))
+
+        with tqdm(total=len(job_ids)) as progress_bar:
+            workers = [
+                asyncio.create_task(self._worker(queue, progress_bar))
+                for _ in range(self._workers_count)
+            ]
+            try:
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+
+                await asyncio.gather(*workers, return_exceptions=True)
+                await self._client.close()
+
+        if self._feature_store is not None:
+            for (ticker, interval), since in self._imported_since.items():
+                await self._feature_store.update_all(ticker, interval, since)
+
+        logger.info('Import finished: %s', self.progress)
+        return self.progress
+
+    async def _worker(self, queue: asyncio.Queue, progress_bar: tqdm):
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._process(job_id)
+
+            except Exception:
+                # Failure of DB operations shouldn't stop the worker, job is retried after restart
+                logger.exception('Import job %s processing failed', job_id)
+                self.progress.failed += 1
+
+            finally:
+                queue.task_done()
+
+                progress_bar.update()
+                progress_bar.set_postfix(candles_per_sec=round(self.progress.candles_per_sec, 1))
+
+    async def _process(self, job_id: int):
+        job = await models.ImportJob.get(id=job_id)
+        await job.fetch_related('instrument')
+
+        job.status = ImportJobStatus.RUNNING
+        job.attempts += 1
+        await job.save()
+
+        try:
+            candles = await self._client.get_candles(
+                job.instrument.figi, interval=job.interval, start_dt=job.start, end_dt=job.end
+            )
+
+            # Candles could be saved by previous attempt, which failed before job was finished
+            await models.Candle.filter(
+                instrument_id=job.instrument_id, interval=job.interval, time__gte=job.start, time__lt=job.end
+            ).delete()
+            job.candles_count = await TinkoffImporter.save_candles(
+                job.instrument, job.interval, candles, job.start, job.end
+            )
+
+        except Exception as e:
+            logger.exception('Import job %s failed (%s, %s)', job.id, job.instrument.ticker, job.interval)
+
+            job.status = ImportJobStatus.FAILED
+            job.error = repr(e)
+
+        else:
+            job.status = ImportJobStatus.DONE
+            job.error = None
+
+            key = (job.instrument.ticker, job.interval)
+            self._imported_since[key] = min(job.start, self._imported_since.get(key, job.start))
+
+        # Progress is updated after save, otherwise failure of save would be counted by worker second time
+        await job.save()
+
+        if job.status == ImportJobStatus.DONE:
+            self.progress.done += 1
+            self.progress.candles += job.candles_count
+        else:
+            self.progress.failed += 1
@@ -0,0 +1,220 @@
+import asyncio
+import datetime as dt
+import functools
+import json
+import logging
+import time
+import typing as t
+
+import websockets
+from websocket._app import WebSocketApp
+
+from . import config
+from . import models
+from .execution import LatencyHistogram
+from .indicators import Indicator
+from .tinkoff import TinkoffStreamClient
+from .tinkoff import parse_candle
+
+logger = logging.getLogger(__name__)
+
+
+REPLAY_HOST = 'localhost'
+REPLAY_PORT = 8765
+
+# How long to wait for subscriptions after the first one, before replay is started
+SUBSCRIBE_TIMEOUT = 0.5
+
+
+def _api_dt(value: dt.datetime) -> str:
+    if value.tzinfo is None:
+        value = config.TIMEZONE.localize(value)
+
+    return value.astimezone(dt.timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class ReplayServer:
+    """Local websocket server, which replays stored candles in Tinkoff streaming API format
+
+    Client subscribes to candles as in real API (`candle:subscribe` event), then candles of [start_dt, end_dt]
+    are sent in event-time order. `speed` is a multiplier of event time (1 = real time, 60 = one hour per minute),
+    `speed=None` sends candles with max throughput.
+
+    `TinkoffStreamClient` is blocking, so it should be run in separate thread by `run_stream_client`
+    (server, message handling and `OrderExecutor` stay in event loop):
+
+    >>> server = ReplayServer(dt.datetime(2020, 10, 1), dt.datetime(2020, 10, 2), speed=600)
+    >>> await server.serve()
+    >>> await run_stream_client(TinkoffStreamClient(token='', url=server.url), on_message=handler, candles_sub={...})
+    >>> await server.close()
+    """
+    def __init__(
+        self,
+        start_dt: dt.datetime,
+        end_dt: dt.datetime,
+        speed: t.Optional[float] = 1.0,
+        host: str = REPLAY_HOST,
+        port: int = REPLAY_PORT,
+    ):
+        self.start_dt = start_dt
+        self.end_dt = end_dt
+        self.speed = speed
+        self.host = host
+        self.port = port
+
+        self.sent = 0
+        self.started_at: float = None
+
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f'ws://{self.host}:{self.port}'
+
+    @property
+    def throughput(self) -> float:
+        """Sent candles per second
+        """
+        if self.started_at is None:
+            return 0.0
+
+        return self.sent / (time.monotonic() - self.started_at)
+
+    async def serve(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        logger.info('Replay server started at %s (speed=%s)', self.url, self.speed or 'max')
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+        logger.info('Replay server stopped. Sent %s candles (%.1f candles/s)', self.sent, self.throughput)
+
+    async def _handle(self, ws: websockets.WebSocketServerProtocol, path: str = None):
+        subscriptions = await self._receive_subscriptions(ws)
+        if not subscriptions:
+            return
+
+        try:
+            await self._replay(ws, subscriptions)
+        except websockets.ConnectionClosed:
+            logger.info('Replay client disconnected')
+
+    @staticmethod
+    async def _receive_subscriptions(ws: websockets.WebSocketServerProtocol) -> t.Dict[str, str]:
+        subscriptions = {}
+        timeout = None
+
+        while True:
+            try:
+                msg = await asyncio.wait_for(ws.recv(), timeout)
+            except asyncio.TimeoutError:
+                return subscriptions
+            except websockets.ConnectionClosed:
+                return {}
+
+            msg_data = json.loads(msg)
+            if msg_data.get('event') == 'candle:subscribe':
+                subscriptions[msg_data['figi']] = msg_data['interval']
+                timeout = SUBSCRIBE_TIMEOUT
+
+                logger.info('Replay subscribed to candle (FIGI=%s)', msg_data['figi'])
+
+    async def _replay(self, ws: websockets.WebSocketServerProtocol, subscriptions: t.Dict[str, str]):
+        instruments = await models.Instrument.filter(figi__in=list(subscriptions))
+        figi_by_id = {instrument.id: instrument.figi for instrument in instruments}
+
+        candles_qs = models.Candle.filter(
+            instrument_id__in=list(figi_by_id),
+            interval__in=list(set(subscriptions.values())),
+            time__gte=self.start_dt,
+            time__lte=self.end_dt,
+        ).order_by('time')
+
+        first_time = None
+        self.started_at = time.monotonic()
+
+        async for candle in models.iter_cursor(candles_qs):
+            figi = figi_by_id[candle['instrument_id']]
+            if subscriptions[figi] != candle['interval']:
+                continue
+
+            if first_time is None:
+                first_time = candle['time']
+
+            if self.speed:
+                delay = self.started_at + (candle['time'] - first_time).total_seconds() / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            await ws.send(json.dumps({
+                'event': 'candle',
+                'time': _api_dt(dt.datetime.now(dt.timezone.utc)),
+                'payload': {
+                    'o': float(candle['open']),
+                    'c': float(candle['close']),
+                    'h': float(candle['high']),
+                    'l': float(candle['low']),
+                    'v': float(candle['volume']),
+                    'time': _api_dt(candle['time']),
+                    'interval': candle['interval'],
+                    'figi': figi,
+                },
+            }))
+            self.sent += 1
+
+        logger.info('Replay finished. Sent %s candles (%.1f candles/s)', self.sent, self.throughput)
+
+
+class CandleStreamHandler:
+    """`on_message` callback for `TinkoffStreamClient`, which passes candles to indicators
+
+    Works both with real API and replay server. Records decision latency (time of indicator reaction
+    to received candle) and delivery latency (from message sending by server to the end of decision).
+    """
+    def __init__(self, indicators: t.Dict[str, Indicator]):
+        self.indicators = indicators
+
+        self.decision_latency = LatencyHistogram()
+        self.delivery_latency = LatencyHistogram()
+        self.received = 0
+
+    def __call__(self, ws: WebSocketApp, msg: str):
+        received_at = time.monotonic()
+
+        msg_data = json.loads(msg)
+        if msg_data['event'] != 'candle':
+            return
+
+        payload = msg_data['payload']
+        indicator = self.indicators.get(payload['figi'])
+        if indicator is None:
+            return
+
+        indicator._on_candle(parse_candle(payload))
+
+        self.received += 1
+        self.decision_latency.record(time.monotonic() - received_at)
+
+        try:
+            sent_at = dt.datetime.fromisoformat(msg_data['time'].replace('Z', '+00:00'))
+        except ValueError:
+            # Real API sends time with nanoseconds, which is not supported by `fromisoformat`
+            return
+
+        self.delivery_latency.record((dt.datetime.now(dt.timezone.utc) - sent_at).total_seconds())
+
+
+async def run_stream_client(stream_client: TinkoffStreamClient, **run_kwargs):
+    """Run blocking `TinkoffStreamClient.run` in thread pool without blocking event loop
+
+    Messages are passed to `on_message` in event loop thread, so indicators can use market and
+    `OrderExecutor` (they are not thread-safe). Returns when stream connection is closed (e.g. replay is finished).
+    """
+    loop = asyncio.get_running_loop()
+
+    on_message = run_kwargs.get('on_message')
+    if on_message is not None:
+        run_kwargs['on_message'] = lambda ws, msg: loop.call_soon_threadsafe(on_message, ws, msg)
+
+    await loop.run_in_executor(None, functools.partial(stream_client.run, **run_kwargs))
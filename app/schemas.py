@@ -1,5 +1,6 @@
 import datetime as dt
 import enum
+import typing as t
 from decimal import Decimal
 
 from pydantic import BaseModel
@@ -22,6 +23,13 @@ class Interval(Enum):
     D30 = 'month'
 
 
+class ImportJobStatus(Enum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
 class Currency(Enum):
     USD = 'USD'
     RUB = 'RUB'
@@ -55,6 +63,52 @@ class PortfolioItem(BaseModel):
     lots: int
 
 
+class PositionType(Enum):
+    long = 'long'
+    short = 'short'
+
+
 class OrderType(Enum):
     BUY = 'buy'
     SELL = 'sell'
+
+
+class Operation(Enum):
+    BUY = 'Buy'
+    SELL = 'Sell'
+
+
+class OrderStatus(Enum):
+    NEW = 'New'
+    PARTIALLY_FILL = 'PartiallyFill'
+    FILL = 'Fill'
+    CANCELLED = 'Cancelled'
+    REPLACED = 'Replaced'
+    PENDING_CANCEL = 'PendingCancel'
+    REJECTED = 'Rejected'
+    PENDING_REPLACE = 'PendingReplace'
+    PENDING_NEW = 'PendingNew'
+
+
+class OrderRequest(BaseModel):
+    figi: str
+    operation: Operation
+    lots: int
+    price: t.Optional[Decimal]  # market order if price is not set
+
+
+class Order(BaseModel):
+    order_id: str
+    figi: t.Optional[str]
+    operation: Operation
+    status: OrderStatus
+    requested_lots: int
+    executed_lots: int = 0
+    reject_reason: t.Optional[str]
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (
+            OrderStatus.NEW, OrderStatus.PARTIALLY_FILL, OrderStatus.PENDING_NEW,
+            OrderStatus.PENDING_CANCEL, OrderStatus.PENDING_REPLACE,
+        )
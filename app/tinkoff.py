@@ -11,7 +11,9 @@ import websocket
 from websocket._app import WebSocketApp
 
 from . import config
+from . import coverage
 from . import models
+from .features import FeatureStore
 from .schemas import Candle
 from .schemas import Instrument
 from .schemas import Interval
@@ -36,6 +38,19 @@ def convert_api_dt(dt_str: str) -> dt.datetime:
     return dt.datetime.fromisoformat(dt_str.replace('Z', '+00:00')).astimezone(config.TIMEZONE)
 
 
+def parse_candle(data: dict) -> Candle:
+    """Candle from API data (same format in REST and streaming API)
+    """
+    return Candle(
+        open=data['o'],
+        high=data['h'],
+        low=data['l'],
+        close=data['c'],
+        volume=data['v'],
+        time=convert_api_dt(data['time'])
+    )
+
+
 class APIError(requests.RequestException):
 
     def __init__(self, message, code):
@@ -156,17 +171,7 @@ class TinkoffClient:
         if 'candles' not in response:
             raise APIError(response['message'], response['code'])
 
-        return (
-            Candle(
-                open=candle['o'],
-                high=candle['h'],
-                low=candle['l'],
-                close=candle['c'],
-                volume=candle['v'],
-                time=convert_api_dt(candle['time'])
-            )
-            for candle in response['candles']
-        )
+        return (parse_candle(candle) for candle in response['candles'])
 
     def sandbox_set_balance(self, amount=Decimal(10000)):
         self.request('POST', 'sandbox/positions/balance', data={
@@ -189,8 +194,8 @@ class TinkoffStreamClient:
 
     Documentation: https://tinkoffcreditsystems.github.io/invest-openapi/marketdata/
     """
-    def __init__(self, token: str):
-        self._url = config.TINKOFF_STREAMING_URL
+    def __init__(self, token: str, url: str = config.TINKOFF_STREAMING_URL):
+        self._url = url
         self.token = token
 
     @staticmethod
@@ -261,11 +266,12 @@ class TinkoffImporter:
         Interval.D1: dt.timedelta(days=365),
     }
 
-    def __init__(self, tinkoff_client: TinkoffClient = None):
+    def __init__(self, tinkoff_client: TinkoffClient = None, feature_store: FeatureStore = None):
         if tinkoff_client is None:
             tinkoff_client = client
 
         self._client = tinkoff_client
+        self._feature_store = feature_store
 
     async def import_stocks(self):
         stocks_data = {stock.ticker: stock for stock in self._client.get_stocks()}
@@ -284,13 +290,30 @@ class TinkoffImporter:
 
         logger.info('Imported %s stocks', len(to_import_tickers))
 
-    # TODO: Skip already imported candles
     # TODO: Move pagination lofic to client class
     async def import_candles(
         self, ticker: str, start_dt: dt.datetime, end_dt: dt.datetime, interval: Interval
     ):
+        """Import candles, which are not imported yet (according to coverage index)
+        """
         instrument = await models.Instrument.get(ticker=ticker)
 
+        if not coverage.index.loaded:
+            await coverage.index.load()
+
+        # There are no candles in the future, so it shouldn't be marked as covered
+        end_dt = min(end_dt, dt.datetime.now(config.TIMEZONE).replace(tzinfo=None))
+
+        missing = coverage.index.missing(instrument.id, interval, start_dt, end_dt)
+        for range_start, range_end in missing:
+            await self._import_candles_range(instrument, range_start, range_end, interval)
+
+        if missing and self._feature_store is not None:
+            await self._feature_store.update_all(ticker, interval, since=missing[0][0])
+
+    async def _import_candles_range(
+        self, instrument: models.Instrument, start_dt: dt.datetime, end_dt: dt.datetime, interval: Interval
+    ):
         if interval in (Interval.D7, Interval.D30):
             candles_data = self._client.get_candles(
                 instrument.figi, interval=interval, start_dt=start_dt, end_dt=end_dt
@@ -299,22 +322,35 @@ class TinkoffImporter:
             batch_size = self.candle_batch_size[interval]
 
             cursor_start = start_dt
-            cursor_end = min(cursor_start + batch_size, end_dt)
 
             candles_data = []
-            while cursor_end <= end_dt:
+            while cursor_start < end_dt:
+                cursor_end = min(cursor_start + batch_size, end_dt)
                 candles_data.append(
                     self._client.get_candles(
                         instrument.figi, interval=interval, start_dt=cursor_start, end_dt=cursor_end
                     )
                 )
                 cursor_start = cursor_end
-                cursor_end += batch_size
 
             candles_data = itertools.chain.from_iterable(candles_data)
 
+        count = await self.save_candles(instrument, interval, candles_data, start_dt, end_dt)
+
+        logger.info('Imported %s candles for %s', count, instrument.name)
+
+    @staticmethod
+    async def save_candles(
+        instrument: models.Instrument,
+        interval: Interval,
+        candles: t.Iterable[Candle],
+        start_dt: dt.datetime,
+        end_dt: dt.datetime,
+    ) -> int:
+        """Save candles fetched for [start_dt, end_dt] range and mark this range as covered
+        """
         objs = []
-        for candle in candles_data:
+        for candle in candles:
             data = candle.dict()
             data['time'] = data['time'].replace(tzinfo=None)
 
@@ -322,5 +358,6 @@ class TinkoffImporter:
                 models.Candle(**data, instrument=instrument, interval=interval)
             )
         await models.Candle.bulk_create(objs)
+        await coverage.index.save(instrument.id, interval, start_dt, end_dt)
 
-        logger.info('Imported %s candles for %s', len(objs), instrument.name)
+        return len(objs)